@@ -5,9 +5,13 @@ import sys
 import sqlite3
 import os
 import re
-import copy
 import compact_json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 def is_valid_table_name(name):
     """Ensures the table name is SQL-safe (letters, numbers, underscores only)."""
     return re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', name) is not None
@@ -30,8 +34,11 @@ def main():
 
     # Load JSON
     try:
-        with open(args.input, 'r') as f:
-            benchmark = json.load(f)
+        with open(args.input, 'rb') as f:
+            if orjson is not None:
+                benchmark = orjson.loads(f.read())
+            else:
+                benchmark = json.load(f)
     except Exception as e:
         sys.exit(f"Failed to load JSON file: {e}")
 
@@ -42,9 +49,13 @@ def main():
     for jacobi_file, details in results.items():
         new_details = {}
         for approach, approach_details in details.items():
-            new_approach_details = copy.deepcopy(approach_details)
-            new_approach_details["summary"].pop("command_lines", None)
-            new_approach_details["summary"].pop("command_line", None)
+            # Only the summary is modified, the rest
+            # (measurements) is shared with the input as is.
+            new_approach_details = dict(approach_details)
+            new_approach_details["summary"] = {
+                k: v for k, v in approach_details["summary"].items()
+                if k not in ("command_lines", "command_line")
+            }
             new_details[approach] = new_approach_details
 
         counter = counter + 1
@@ -1,114 +1,198 @@
 import csv
-import json
 import argparse
 import sys
 import sqlite3
 import os
 import re
+import itertools
+import json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Parse errors of the JSON reader in use
+JSON_ERRORS = (ijson.JSONError,) if ijson is not None else (json.JSONDecodeError,)
+
+# Column order of the rows produced by validate_and_extract().
+FIELDNAMES = ["git_commit", "compiler", "jacobi_data", "orders_table_storage", "components", "mps"]
 
 def is_valid_table_name(name):
     """Ensures the table name is SQL-safe (letters, numbers, underscores only)."""
     return re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', name) is not None
 
-def validate_and_extract(data):
-    """Validates the nested structure and yields rows of data."""
-    if "results" not in data:
-        sys.exit("Error: Missing top-level 'results' field.")
+def validate_and_extract(results_items, git_commit, compiler):
+    """
+    Validates the nested structure and yields rows of data.
 
-    results = data["results"]
-    if not isinstance(results, dict):
-        sys.exit("Error: 'results' must be an object.")
+    `results_items` is an iterable of (jacobi_data, storage_map) pairs
+    taken from the top-level 'results' object, so the entries
+    can be streamed one at a time.
+    Rows are tuples in FIELDNAMES order.
+    """
+    # Malformed input is detected by the failing lookups themselves,
+    # so well-formed input pays no per-item isinstance checks.
 
     # Level 1: Jacobi Data
-    for jacobi_key, storage_map in results.items():
-        if not isinstance(storage_map, dict):
+    for jacobi_key, storage_map in results_items:
+        try:
+            storage_items = storage_map.items()
+        except AttributeError:
             sys.exit(f"Error: results['{jacobi_key}'] must be an object.")
 
         # Level 2: Orders Table Storage
-        for storage_key, storage_val in storage_map.items():
-            if not isinstance(storage_val, dict) or "measurements" not in storage_val:
+        for storage_key, storage_val in storage_items:
+            try:
+                measurements = storage_val["measurements"]
+            except (KeyError, TypeError):
                 sys.exit(f"Error: '{storage_key}' must be an object containing 'measurements'.")
 
-            measurements = storage_val["measurements"]
-            if not isinstance(measurements, dict):
+            try:
+                measurements_items = measurements.items()
+            except AttributeError:
                 sys.exit(f"Error: 'measurements' under '{storage_key}' must be an object.")
 
             # Level 3: Components
-            for component_key, component_val in measurements.items():
-                if not isinstance(component_val, dict) or "value_Mps" not in component_val:
+            for component_key, component_val in measurements_items:
+                try:
+                    mps = component_val["value_Mps"]
+                except (KeyError, TypeError):
                     sys.exit(f"Error: Component '{component_key}' must contain 'value_Mps'.")
 
                 # Yield the specific data for this row
-                yield {
-                    "jacobi_data": jacobi_key,
-                    "orders_table_storage": storage_key,
-                    "components": component_key,
-                    "mps": component_val["value_Mps"]
-                }
-
-def write_csv(filename, rows, fieldnames):
-    new_file = not os.path.exists(filename)
-    with open(filename, mode='a', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if new_file or os.path.getsize(filename) == 0:
-            writer.writeheader()
-        writer.writerows(rows)
-    print(f"Logged {len(rows)} rows to CSV: {filename}")
+                yield (git_commit, compiler, jacobi_key,
+                       storage_key, component_key, mps)
+
+def load_results_items(json_file):
+    """
+    Loads the whole JSON file and returns the items of its 'results' object.
+    Used when ijson is not available for streaming.
+    """
+    data = json.load(json_file)
+    if "results" not in data:
+        sys.exit("Error: Missing top-level 'results' field.")
+
+    results = data["results"]
+    if not isinstance(results, dict):
+        sys.exit("Error: 'results' must be an object.")
+    return results.items()
+
+def check_results_field(json_file):
+    """
+    Exits unless the top-level 'results' field is present and is an object.
+
+    Streaming yields nothing both for an empty 'results' object
+    and for a missing or malformed one, this tells them apart.
+    """
+    json_file.seek(0)
+    for prefix, event, _ in ijson.parse(json_file):
+        # The first event under 'results' is the start of its value.
+        if prefix == "results":
+            if event != "start_map":
+                sys.exit("Error: 'results' must be an object.")
+            return
+    sys.exit("Error: Missing top-level 'results' field.")
+
+def write_csv(filename, rows):
+    try:
+        orig_size = os.stat(filename).st_size
+    except FileNotFoundError:
+        orig_size = None
+
+    # 1 MiB write buffer: fewer write syscalls on large outputs.
+    with open(filename, mode='a', newline='', buffering=1 << 20) as csvfile:
+        try:
+            writer = csv.writer(csvfile)
+            if not orig_size:
+                writer.writerow(FIELDNAMES)
+
+            rows_count = 0
+            for rows_count, row in enumerate(rows, 1):
+                writer.writerow(row)
+        except BaseException:
+            # Rows are streamed from the input, a broken input file
+            # must not leave a partial append (or a new file) behind.
+            if orig_size is None:
+                csvfile.close()
+                os.remove(filename)
+            else:
+                csvfile.flush()
+                csvfile.truncate(orig_size)
+            raise
+    print(f"Logged {rows_count} rows to CSV: {filename}")
 
 def write_sqlite(filename, rows, table_name):
     if not is_valid_table_name(table_name):
         sys.exit(f"Error: Invalid table name '{table_name}'. Use only letters, numbers, and underscores.")
 
-    conn = sqlite3.connect(filename)
-    cursor = conn.cursor()
-
-    # 1. Create Table dynamically using the provided table_name
-    cursor.execute(f'''
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            git_commit TEXT,
-            compiler TEXT,
-            jacobi_data TEXT,
-            orders_table_storage TEXT,
-            components TEXT,
-            mps REAL
-        )
-    ''')
-
-    # 2. Create Indexes
-    cursor.execute(f'''
-        CREATE INDEX IF NOT EXISTS idx_{table_name}_comp_storage
-            ON {table_name} (compiler, orders_table_storage)
-    ''')
-    cursor.execute(f'''
-        CREATE INDEX IF NOT EXISTS idx_{table_name}_comp_storage_components
-            ON {table_name} (compiler, orders_table_storage, components)
-    ''')
-    cursor.execute(f'''
-        CREATE INDEX IF NOT EXISTS idx_{table_name}_book_unit
-            ON {table_name} (orders_table_storage, components)
+    # Manual transaction control: the only transaction is
+    # the explicit BEGIN ... COMMIT below.
+    conn = sqlite3.connect(filename, isolation_level=None)
+
+    # Bulk load settings: fewer fsyncs, temp data in memory.
+    # The journal mode is left at its default: WAL would persist
+    # in the file and gains nothing for a single transaction.
+    conn.executescript('''
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-65536;
+        PRAGMA mmap_size=268435456;
     ''')
-    cursor.execute(f'''
-        CREATE INDEX IF NOT EXISTS idx_{table_name}_file_unit
-            ON {table_name} (jacobi_data)
-    ''')
-
-    # 3. Insert Data
-    # We convert the list of dicts to a list of tuples for executemany
-    data_tuples = [
-        (r['git_commit'], r['compiler'], r['jacobi_data'],
-         r['orders_table_storage'], r['components'], r['mps'])
-        for r in rows
-    ]
 
-    cursor.executemany(f'''
-        INSERT INTO {table_name} (git_commit, compiler, jacobi_data, orders_table_storage, components, mps)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', data_tuples)
-
-    conn.commit()
-    conn.close()
-    print(f"Logged {len(rows)} rows to SQLite: {filename}")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+
+        # 1. Create Table dynamically using the provided table_name
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                git_commit TEXT,
+                compiler TEXT,
+                jacobi_data TEXT,
+                orders_table_storage TEXT,
+                components TEXT,
+                mps REAL
+            )
+        ''')
+
+        # 2. Insert Data
+        # executemany consumes the rows iterator directly.
+        insert_cursor = conn.executemany(f'''
+            INSERT INTO {table_name} (git_commit, compiler, jacobi_data, orders_table_storage, components, mps)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        rows_count = insert_cursor.rowcount
+
+        # 3. Create Indexes
+        # Done after the insert, so a fresh table gets each index
+        # built in a single pass instead of maintaining it per row.
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table_name}_comp_storage
+                ON {table_name} (compiler, orders_table_storage)
+        ''')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table_name}_comp_storage_components
+                ON {table_name} (compiler, orders_table_storage, components)
+        ''')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table_name}_book_unit
+                ON {table_name} (orders_table_storage, components)
+        ''')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table_name}_file_unit
+                ON {table_name} (jacobi_data)
+        ''')
+
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    print(f"Logged {rows_count} rows to SQLite: {filename}")
 
 def main():
     parser = argparse.ArgumentParser()
@@ -119,35 +203,40 @@ def main():
     parser.add_argument("--table", default="measurements", help="Table name for SQLite output (default: measurements)")
     args = parser.parse_args()
 
-    # Load JSON
-    try:
-        with open(args.json_path, 'r') as f:
-            raw_data = json.load(f)
-    except Exception as e:
-        sys.exit(f"Failed to load JSON file: {e}")
-
-    # Prepare Data Buffer
-    all_rows = []
-    for entry in validate_and_extract(raw_data):
-        full_row = {
-            "git_commit": args.commit,
-            "compiler": args.compiler,
-            **entry
-        }
-        all_rows.append(full_row)
-
-    if not all_rows:
-        print("No valid data found in JSON to write.")
-        sys.exit(0)
-
     # Detect Format based on extension
     if args.output.endswith('.csv'):
-        fieldnames = ["git_commit", "compiler", "jacobi_data", "orders_table_storage", "components", "mps"]
-        write_csv(args.output, all_rows, fieldnames)
+        write_rows = lambda rows: write_csv(args.output, rows)
     elif args.output.endswith(('.db', '.sqlite', '.sqlite3')):
-        write_sqlite(args.output, all_rows, args.table)
+        write_rows = lambda rows: write_sqlite(args.output, rows, args.table)
     else:
         sys.exit("Error: Output file must end with .csv, .db, or .sqlite")
 
+    try:
+        json_file = open(args.json_path, 'rb')
+    except Exception as e:
+        sys.exit(f"Failed to load JSON file: {e}")
+
+    with json_file:
+        try:
+            if ijson is not None:
+                # Stream JSON: only a single jacobi_data entry
+                # is materialized at a time.
+                results_items = ijson.kvitems(json_file, 'results', use_float=True)
+            else:
+                results_items = load_results_items(json_file)
+            rows_iter = validate_and_extract(results_items, args.commit, args.compiler)
+
+            first_row = next(rows_iter, None)
+            if first_row is None:
+                if ijson is not None:
+                    check_results_field(json_file)
+                print("No valid data found in JSON to write.")
+                sys.exit(0)
+
+            # Rows go straight from the parser to the output.
+            write_rows(itertools.chain((first_row,), rows_iter))
+        except JSON_ERRORS as e:
+            sys.exit(f"Failed to load JSON file: {e}")
+
 if __name__ == "__main__":
     main()
@@ -1,7 +1,6 @@
 import json
 import os
 import subprocess
-import glob
 import re
 import time
 import datetime
@@ -11,10 +10,29 @@ import shlex
 import compact_json
 import platform
 import itertools
+import functools
+import concurrent.futures as cf
 
 # --- Constants ---
 RECORD_SIZE_BYTES = 32
 
+# Relaxed JSON: C-style comments (// ...) and trailing commas.
+# Both are removed in a single pass, a trailing comma
+# can be followed by comments before the closing bracket.
+RELAXED_JSON_RE = re.compile(r'\s*//[^\n]*|,(?:\s|//[^\n]*)*(?=[}\]])')
+
+# Regex for parsing the specific benchmark output format
+BENCHMARK_LINE_RE = re.compile(r"^([\w\d_\/]+)\s+.+items_per_second=([0-9\.]+)([kMGT]?)\/s")
+
+# Multipliers to convert everything to M/s
+UNIT_MULTIPLIERS = { 'T': 1e6, 'G': 1e3, 'M': 1.0, 'k': 1e-3, '': 1e-6 }
+
+# /proc/cpuinfo fields, e.g.
+#   "model name : Intel(R) Core(TM)..."
+#   "cpu MHz      : 2200.000"
+CPUINFO_MODEL_RE = re.compile(r'^model name\s*:\s*(.+)$', re.MULTILINE)
+CPUINFO_MHZ_RE = re.compile(r'^cpu MHz\s*:\s*([\d.]+)', re.MULTILINE)
+
 def parse_arguments():
     """Parses command line arguments."""
     parser = argparse.ArgumentParser(description="Run Google Benchmark suite using custom data files.")
@@ -31,6 +49,30 @@ def parse_arguments():
         help='Path where the result JSON will be saved (default: benchmark_results.json)'
     )
 
+    parser.add_argument(
+        '-j', '--parallel',
+        type=int,
+        default=1,
+        help='Number of matrix combinations to run concurrently (default: 1). '
+             'Values above 1 trade measurement accuracy for wall time, '
+             'make sure the wrapper does not pin all runs to the same core'
+    )
+
+    parser.add_argument(
+        '--matrix-single-run',
+        action='store_true',
+        help='Run all matrix combinations of a binary in a single benchmark process '
+             '(one --benchmark_filter regex) instead of a separate process per combination. '
+             'Saves process startup per combination, but gives up process isolation'
+    )
+
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue an interrupted run: results logged to <OUTPUT>.partial.jsonl '
+             'are restored and the runs they cover are skipped'
+    )
+
     return parser.parse_args()
 
 def load_relaxed_json(filepath):
@@ -44,13 +86,8 @@ def load_relaxed_json(filepath):
     with open(filepath, 'r') as f:
         content = f.read()
 
-    # 1. Remove comments (// ...)
-    comment_pattern = re.compile(r'\s*//.*')
-    content = re.sub(comment_pattern, '', content)
-
-    # 2. Remove trailing commas
-    trailing_comma_pattern = re.compile(r',(\s*[}\]])')
-    content = re.sub(trailing_comma_pattern, r'\1', content)
+    # Remove comments (// ...) and trailing commas
+    content = RELAXED_JSON_RE.sub('', content)
 
     try:
         return json.loads(content)
@@ -61,36 +98,39 @@ def load_relaxed_json(filepath):
 def find_data_files(data_dir):
     """Finds all files with .jacobi_data extension in the given directory."""
     data_dir = os.path.expanduser(data_dir)
-    search_path = os.path.join(data_dir, "*.jacobi_data")
-    files = glob.glob(search_path)
+    try:
+        # Like glob "*.jacobi_data": hidden files are skipped.
+        with os.scandir(data_dir) as entries:
+            files = [
+                e.path for e in entries
+                if e.name.endswith(".jacobi_data") and not e.name.startswith(".") and e.is_file()
+            ]
+    except OSError:
+        files = []
+
     if not files:
         print(f"Warning: No .jacobi_data files found in {data_dir}")
     return sorted(files)
 
-def parse_benchmark_output(output_text):
+def parse_benchmark_output(output_lines):
     """
-    Parses Google Benchmark stdout.
+    Parses Google Benchmark stdout given as an iterable of lines.
     1. Extracts items_per_second and converts to M/s.
     2. Calculates min/max for the whole set.
     3. Adds a 'ratio' field to each measurement (value / max).
     """
     temp_measurements = {}
-
-    # Regex for parsing the specific benchmark output format
-    regex = re.compile(r"^([\w\d_\/]+)\s+.+items_per_second=([0-9\.]+)([kMGT]?)\/s")
-
-    # Multipliers to convert everything to M/s
-    multipliers = { 'T': 1e6, 'G': 1e3, 'M': 1.0, 'k': 1e-3, '': 1e-6 }
+    search = BENCHMARK_LINE_RE.search
 
     # 1. Parse raw values
-    for line in output_text.splitlines():
-        match = regex.search(line)
+    for line in output_lines:
+        match = search(line)
         if match:
             bench_name = match.group(1)
             raw_value = float(match.group(2))
             unit_suffix = match.group(3)
 
-            factor = multipliers.get(unit_suffix, 0)
+            factor = UNIT_MULTIPLIERS.get(unit_suffix, 0)
             final_value = raw_value * factor
 
             temp_measurements[bench_name] = final_value
@@ -147,10 +187,13 @@ def calculate_range_env(data_file_path):
         print(f"  [!] Error calculating range for file {data_file_path}: {e}")
         return "0,0"
 
+@functools.cache
 def get_system_info():
     """
     Gathers system information to mimic Google Benchmark output.
     Returns a dict containing 'run_on', 'caches', 'load_avg', etc.
+
+    The result is cached, so callers must not modify it.
     """
     info = {
         "host": platform.node(),
@@ -159,18 +202,20 @@ def get_system_info():
         "cpu_model": platform.processor(),
     }
 
-    # --- 1. Get Detailed CPU Model Name (Linux) ---
+    # /proc/cpuinfo is read once and used for both model and frequency.
+    cpuinfo_text = ""
     if sys.platform.startswith('linux'):
         try:
             with open("/proc/cpuinfo", "r") as f:
-                for line in f:
-                    if "model name" in line:
-                        # format: "model name : Intel(R) Core(TM)..."
-                        info["cpu_model"] = line.split(':', 1)[1].strip()
-                        break
+                cpuinfo_text = f.read()
         except Exception:
             pass
 
+    # --- 1. Get Detailed CPU Model Name (Linux) ---
+    model_match = CPUINFO_MODEL_RE.search(cpuinfo_text)
+    if model_match:
+        info["cpu_model"] = model_match.group(1).strip()
+
     # --- 2. Attempt to determine frequency for "Run on" string ---
     freq_mhz = 0
     try:
@@ -190,16 +235,9 @@ def get_system_info():
 
             # Fallback to /proc/cpuinfo for frequency if sysfs failed
             if freq_mhz == 0:
-                with open("/proc/cpuinfo", "r") as f:
-                    for line in f:
-                        if "cpu MHz" in line:
-                            # format: "cpu MHz      : 2200.000"
-                            parts = line.split(':')
-                            if len(parts) > 1:
-                                freq_mhz = float(parts[1].strip())
-                            break
-                        if "model name" in line:
-                             info["cpu_model"] = line.split(':', 1)[1].strip()
+                mhz_match = CPUINFO_MHZ_RE.search(cpuinfo_text)
+                if mhz_match:
+                    freq_mhz = float(mhz_match.group(1))
 
     except Exception:
         pass # Fail silently on freq detection
@@ -222,9 +260,9 @@ def get_system_info():
         if os.path.exists(cache_dir):
             try:
                 # Iterate index0, index1, etc.
-                indices = sorted([d for d in os.listdir(cache_dir) if d.startswith("index")])
-                for idx_dir in indices:
-                    path = os.path.join(cache_dir, idx_dir)
+                with os.scandir(cache_dir) as entries:
+                    indices = sorted(e.path for e in entries if e.name.startswith("index"))
+                for path in indices:
                     with open(os.path.join(path, "size"), "r") as f: s = f.read().strip()
                     with open(os.path.join(path, "level"), "r") as f: l = f.read().strip()
                     with open(os.path.join(path, "type"), "r") as f: t = f.read().strip()
@@ -282,15 +320,19 @@ def run_single_benchmark(binary_path, data_file, wrapper, extra_args, extra_env_
     full_cmd_str = f"{' '.join(env_str_parts)} {cmd_base}"
 
     try:
-        result = subprocess.run(
+        # Lines are parsed as they come,
+        # the whole output is never held in memory.
+        with subprocess.Popen(
             cmd,
             env=env,
-            capture_output=True,
-            text=True,
-            check=True
-        )
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        ) as proc:
+            data = parse_benchmark_output(proc.stdout)
 
-        data = parse_benchmark_output(result.stdout)
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
 
         # Inject the command line into the summary
         if data and "summary" in data:
@@ -305,6 +347,45 @@ def run_single_benchmark(binary_path, data_file, wrapper, extra_args, extra_env_
         print(f"  [!] Command or Binary not found. Path: {binary_path}")
         return {}
 
+def append_progress(filepath, filename, bin_alias, bench_data):
+    """
+    Appends a single result entry as a line to the JSONL progress file.
+
+    Each line is `{filename: {bin_alias: bench_data}}`, so the results tree
+    can be restored by merging the lines in order.
+    Unlike the final save_results() there is no fsync here,
+    progress lines are left to the OS page cache.
+    """
+    line = json.dumps({filename: {bin_alias: bench_data}}, separators=(',', ':'))
+    with open(filepath, 'a') as f:
+        f.write(line + "\n")
+
+def load_progress(filepath):
+    """
+    Restores the results tree from the JSONL progress file.
+
+    Lines are merged in order, a line that cannot be parsed
+    (e.g. torn by a crash while it was written) is skipped.
+    """
+    results_tree = {}
+    line = b""
+    with open(filepath, 'rb') as f:
+        for line_no, line in enumerate(f, 1):
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"  [!] Warning: Skipping unreadable line {line_no} of {filepath}")
+                continue
+            for filename, binaries in entry.items():
+                results_tree.setdefault(filename, {}).update(binaries)
+
+    if line and not line.endswith(b"\n"):
+        # Keep lines appended from now on apart from a torn last line
+        with open(filepath, 'ab') as f:
+            f.write(b"\n")
+
+    return results_tree
+
 def save_results(filepath, settings, system_info, start_time, start_ts, results_tree):
     """Helper to save the JSON file with current timestamp stats."""
 
@@ -355,130 +436,179 @@ def main():
     # 2. Find Data
     data_files = find_data_files(data_dir)
 
-    results_tree = {}
+    # Progress is appended to a sidecar file after every run,
+    # so rewriting the whole results tree happens only once at the end.
+    # The file is only removed after a complete run, an existing one
+    # holds the results of an interrupted run and is never overwritten.
+    progress_path = f"{args.output}.partial.jsonl"
+    if args.resume and os.path.exists(progress_path):
+        results_tree = load_progress(progress_path)
+        restored_count = sum(len(binaries) for binaries in results_tree.values())
+        print(f"Resuming: {restored_count} runs restored from {progress_path}")
+    elif os.path.exists(progress_path):
+        sys.exit(f"Error: {progress_path} is left from an interrupted run. "
+                 f"Use --resume to continue it, or remove the file to start over.")
+    else:
+        results_tree = {}
+        with open(progress_path, 'wb'):
+            pass
+    print(f"Progress is logged to {progress_path}")
 
     # 3. Execution Loop
-    total_files = len(data_files)
-    for i, d_file in enumerate(data_files):
-        filename = os.path.basename(d_file)
-        print(f"[{i+1}/{total_files}] Processing data: {filename}")
-
-        results_tree[filename] = {}
-
-        for bin_entry in binaries_config:
-            if not isinstance(bin_entry, dict):
-                print(f"  [!] Warning: Invalid binary config. Skipping.")
-                continue
-
-            bin_filename = bin_entry.get("file")
-            bin_alias = bin_entry.get("alias")
-
-            # 1. Determine Type
-            bin_type = bin_entry.get("type", "full")
-
-            # 2. Prepare Environment (Make a COPY of the base config env)
-            current_run_env = bin_entry.get("env", {}).copy()
-
-            if not bin_filename or not bin_alias:
-                 print(f"  [!] Warning: Missing 'file' or 'alias' in: {bin_entry}")
-                 continue
-
-            binary_path = os.path.join(bin_dir, bin_filename)
-            if os.name == 'nt' and not binary_path.endswith('.exe'):
-                binary_path += '.exe'
-
-            # 3. Handle specific types
-            if bin_type == "range":
-                range_str = calculate_range_env(d_file)
-                current_run_env["JACOBI_BENCHMARK_EVENTS_RANGE"] = range_str
-                print(f"  > Running: {bin_alias} [Range: {range_str}]")
-            elif bin_type == "full":
-                print(f"  > Running: {bin_alias}")
-            else:
-                print(f"  > Running: {bin_alias} (Unknown type '{bin_type}', defaulting to full)")
-
-            # Pause: thermal cooldown...
-            time.sleep(0.2)
-
-            # --- Matrix or Standard Execution ---
-            if "matrix" in settings:
-                matrix = settings["matrix"]
-                bsn_opts = matrix.get("bsn", [])
-                plvl_opts = matrix.get("plvl", [])
-                refIX_opts = matrix.get("refIX", [])
-
-                combinations = list(itertools.product(bsn_opts, plvl_opts, refIX_opts))
-                print(f"    - Matrix Mode: Executing {len(combinations)} combinations... ", end='', flush=True)
-
-                aggregated_measurements = {}
-
-                comman_lines = []
-                max_mps = 0.0
-                min_mps = 0.0
-                max_name = "?"
-
-                for (b, p, r) in combinations:
-                    target_name = f"{b}_{p}_{r}"
-                    # Strict filter for exact match
-                    filter_arg = f"--benchmark_filter={target_name}"
-
-                    # Combine args
-                    run_args = extra_args + [filter_arg]
+    try:
+        total_files = len(data_files)
+        for i, d_file in enumerate(data_files):
+            filename = os.path.basename(d_file)
+            print(f"[{i+1}/{total_files}] Processing data: {filename}")
+
+            results_tree.setdefault(filename, {})
+
+            for bin_entry in binaries_config:
+                if not isinstance(bin_entry, dict):
+                    print(f"  [!] Warning: Invalid binary config. Skipping.")
+                    continue
+
+                bin_filename = bin_entry.get("file")
+                bin_alias = bin_entry.get("alias")
+
+                # 1. Determine Type
+                bin_type = bin_entry.get("type", "full")
+
+                # 2. Prepare Environment (Make a COPY of the base config env)
+                current_run_env = bin_entry.get("env", {}).copy()
+
+                if not bin_filename or not bin_alias:
+                     print(f"  [!] Warning: Missing 'file' or 'alias' in: {bin_entry}")
+                     continue
+
+                # Failed runs are logged without measurements, those are redone
+                if results_tree[filename].get(bin_alias, {}).get("measurements"):
+                    print(f"  > Skipping: {bin_alias} (restored from progress)")
+                    continue
+
+                binary_path = os.path.join(bin_dir, bin_filename)
+                if os.name == 'nt' and not binary_path.endswith('.exe'):
+                    binary_path += '.exe'
+
+                # 3. Handle specific types
+                if bin_type == "range":
+                    range_str = calculate_range_env(d_file)
+                    current_run_env["JACOBI_BENCHMARK_EVENTS_RANGE"] = range_str
+                    print(f"  > Running: {bin_alias} [Range: {range_str}]")
+                elif bin_type == "full":
+                    print(f"  > Running: {bin_alias}")
+                else:
+                    print(f"  > Running: {bin_alias} (Unknown type '{bin_type}', defaulting to full)")
+
+                # Pause: thermal cooldown...
+                time.sleep(0.2)
+
+                # --- Matrix or Standard Execution ---
+                if "matrix" in settings:
+                    matrix = settings["matrix"]
+                    bsn_opts = matrix.get("bsn", [])
+                    plvl_opts = matrix.get("plvl", [])
+                    refIX_opts = matrix.get("refIX", [])
+
+                    combinations = list(itertools.product(bsn_opts, plvl_opts, refIX_opts))
+                    print(f"    - Matrix Mode: Executing {len(combinations)} combinations... ", end='', flush=True)
+
+                    aggregated_measurements = {}
+
+                    comman_lines = []
+
+                    # Each matrix run is a list of expected benchmark names
+                    # and its command line args.
+                    matrix_runs = []
+                    target_names = [f"{b}_{p}_{r}" for (b, p, r) in combinations]
+                    if args.matrix_single_run:
+                        # One process, filter selects all the combinations
+                        filter_arg = "--benchmark_filter=^(" + "|".join(re.escape(t) for t in target_names) + ")$"
+                        matrix_runs.append((target_names, extra_args + [filter_arg]))
+                    else:
+                        for target_name in target_names:
+                            # Strict filter for exact match
+                            filter_arg = f"--benchmark_filter={target_name}"
+
+                            # Combine args
+                            matrix_runs.append(([target_name], extra_args + [filter_arg]))
+
+                    def run_matrix_item(run_args):
+                        if args.parallel <= 1:
+                            # Note: We do only a short sleep between matrix items
+                            # to keep total time reasonable,
+                            # but be aware of thermal throttling if count is high.
+                            time.sleep(0.025)
+                        return run_single_benchmark(binary_path, d_file, wrapper, run_args, current_run_env)
 
-                    time.sleep(0.025)
                     # Execute
-                    # Note: We do not sleep between matrix items to keep total time reasonable,
-                    # but be aware of thermal throttling if count is high.
-                    bench_data = run_single_benchmark(binary_path, d_file, wrapper, run_args, current_run_env)
-
-                    comman_lines.append(bench_data["summary"]["command_line"])
-                    current_meas = bench_data.get("measurements", {})
-
-                    # Validation: Check 1 row and Name match
-                    items = list(current_meas.items())
-                    if len(items) != 1:
-                        print(f"      [!] Warning: Matrix run for '{target_name}' returned {len(items)} rows. Expected 1.")
-
-                    for m_name, m_data in items:
-                        # Allow exact match
-                        if m_name != target_name:
-                             print(f"      [!] Warning: Output name '{m_name}' does not match target '{target_name}'")
-
-                        # Add to aggregate
-                        aggregated_measurements[m_name] = m_data
-                        if max_mps < m_data["value_Mps"]:
-                            max_mps = m_data["value_Mps"];
-                            max_name = m_name
-
-                        min_mps = min(min_mps, m_data["value_Mps"])
-
-                # # Post-Matrix: Re-calculate stats (max, min, ratio) for the whole set
-                # vals = [m['value_Mps'] for m in aggregated_measurements.values()]
-
-                final_summary = {
-                    "max_Mps": max_mps,
-                    "max_at": max_name,
-                    "min_Mps": min_mps,
-                    "command_lines": comman_lines
-                }
-                print(f"MAX: {max_mps} Mps ({max_name})")
-
-                # Update ratios based on new max
-                for m in aggregated_measurements.values():
-                    ratio = (m['value_Mps'] / max_mps) if max_mps > 0 else 0.0
-                    m['ratio'] = round(ratio, 4)
-
-                results_tree[filename][bin_alias] = {
-                    "summary": final_summary,
-                    "measurements": aggregated_measurements
-                }
-            else:
-                # Standard Logic (Run once, parse all)
-                bench_data = run_single_benchmark(binary_path, d_file, wrapper, extra_args, current_run_env)
-                results_tree[filename][bin_alias] = bench_data
-
-        print(f"  > Saving progress to {args.output}...")
+                    # Each combination is a separate process with no shared state,
+                    # so with --parallel they can run concurrently
+                    # (subprocess waits release the GIL, threads are enough).
+                    run_args_list = [run_args for _, run_args in matrix_runs]
+                    if args.parallel > 1:
+                        with cf.ThreadPoolExecutor(max_workers=args.parallel) as executor:
+                            matrix_results = list(executor.map(run_matrix_item, run_args_list))
+                    else:
+                        matrix_results = map(run_matrix_item, run_args_list)
+
+                    for (run_targets, _), bench_data in zip(matrix_runs, matrix_results):
+                        comman_lines.append(bench_data["summary"]["command_line"])
+                        current_meas = bench_data.get("measurements", {})
+                        targets_str = "|".join(run_targets)
+
+                        # Validation: Check rows count and Name match
+                        items = list(current_meas.items())
+                        if len(items) != len(run_targets):
+                            print(f"      [!] Warning: Matrix run for '{targets_str}' returned {len(items)} rows. Expected {len(run_targets)}.")
+
+                        for m_name, m_data in items:
+                            # Allow exact match
+                            if m_name not in run_targets:
+                                 print(f"      [!] Warning: Output name '{m_name}' does not match target '{targets_str}'")
+
+                            # Add to aggregate
+                            aggregated_measurements[m_name] = m_data
+
+                    # Post-Matrix: Re-calculate stats (max, min, ratio) for the whole set
+                    if aggregated_measurements:
+                        max_name = max(aggregated_measurements,
+                                       key=lambda name: aggregated_measurements[name]["value_Mps"])
+                        max_mps = aggregated_measurements[max_name]["value_Mps"]
+                        min_mps = min(m["value_Mps"] for m in aggregated_measurements.values())
+                    else:
+                        max_mps = 0.0
+                        min_mps = 0.0
+                        max_name = "?"
+
+                    final_summary = {
+                        "max_Mps": max_mps,
+                        "max_at": max_name,
+                        "min_Mps": min_mps,
+                        "command_lines": comman_lines
+                    }
+                    print(f"MAX: {max_mps} Mps ({max_name})")
+
+                    # Update ratios based on new max
+                    for m in aggregated_measurements.values():
+                        ratio = (m['value_Mps'] / max_mps) if max_mps > 0 else 0.0
+                        m['ratio'] = round(ratio, 4)
+
+                    results_tree[filename][bin_alias] = {
+                        "summary": final_summary,
+                        "measurements": aggregated_measurements
+                    }
+                else:
+                    # Standard Logic (Run once, parse all)
+                    bench_data = run_single_benchmark(binary_path, d_file, wrapper, extra_args, current_run_env)
+                    results_tree[filename][bin_alias] = bench_data
+
+                append_progress(progress_path, filename, bin_alias, results_tree[filename][bin_alias])
+    finally:
+        # Interrupted runs still leave a readable output JSON,
+        # the progress file is kept for --resume.
         save_results(args.output, settings, system_info, start_time, start_ts, results_tree)
+    os.remove(progress_path)
 
     print(f"\n--- Done! ---")
     print(f"Final results saved to: {os.path.abspath(args.output)}")
@@ -6,6 +6,11 @@ from plotly.subplots import make_subplots
 import argparse
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Visualize benchmark results.")
     parser.add_argument('-i', '--input', default='benchmark_results.json', help='Input JSON file')
@@ -16,6 +21,10 @@ def load_data(filepath):
     if not os.path.exists(filepath):
         print(f"File not found: {filepath}")
         exit(1)
+    if orjson is not None:
+        # orjson parses bytes directly, no text decoding step.
+        with open(filepath, 'rb') as f:
+            return orjson.loads(f.read())
     with open(filepath, 'r') as f:
         return json.load(f)
 
@@ -23,7 +32,8 @@ def flatten_json_to_df(data):
     """
     Converts the nested JSON results into a flat Pandas DataFrame.
     """
-    rows = []
+    # Column-oriented buffers: one list per DataFrame column.
+    files, binaries_col, benches, speeds, ratios = [], [], [], [], []
 
     # Structure: results -> filename -> binary_alias -> measurements
     results = data.get("results", {})
@@ -33,15 +43,19 @@ def flatten_json_to_df(data):
             measurements = bin_data.get("measurements", {})
 
             for bench_name, metrics in measurements.items():
-                rows.append({
-                    "Data File": filename,
-                    "Binary": binary_alias,
-                    "Benchmark": bench_name,
-                    "Speed (M/s)": metrics.get("value_Mps", 0),
-                    "Ratio": metrics.get("ratio", 0)
-                })
-
-    return pd.DataFrame(rows)
+                files.append(filename)
+                binaries_col.append(binary_alias)
+                benches.append(bench_name)
+                speeds.append(metrics.get("value_Mps", 0))
+                ratios.append(metrics.get("ratio", 0))
+
+    return pd.DataFrame({
+        "Data File": files,
+        "Binary": binaries_col,
+        "Benchmark": benches,
+        "Speed (M/s)": speeds,
+        "Ratio": ratios
+    })
 
 def create_dashboard(df, output_file):
     """
@@ -60,51 +74,36 @@ def create_dashboard(df, output_file):
     # --- 1. Create Traces ---
     # We create a set of bars for EVERY data file, but initially hide all except the first one.
 
-    # We need to track how many traces belong to each file to manage visibility
-    traces_per_file = []
-
-    for i, filename in enumerate(data_files):
-        file_df = df[df["Data File"] == filename]
-
-        # We need to pivot so we have columns for each binary to group them easily
-        # However, Plotly Graph Objects works best by adding traces manually for grouping
-        binaries = file_df["Binary"].unique()
-
-        count = 0
-        for binary in binaries:
-            subset = file_df[file_df["Binary"] == binary]
-
-            visible = (i == 0) # Only make the first file visible by default
-
-            fig.add_trace(go.Bar(
-                x=subset["Benchmark"],
-                y=subset["Speed (M/s)"],
-                name=binary,
-                visible=visible,
-                customdata=subset[["Ratio"]],
-                hovertemplate=(
-                    "<b>%{x}</b><br>" +
-                    "Binary: " + binary + "<br>" +
-                    "Speed: %{y:.2f} M/s<br>" +
-                    "Ratio: %{customdata[0]:.2f}<extra></extra>"
-                )
-            ))
-            count += 1
-        traces_per_file.append(count)
+    # We need to track which file each trace belongs to to manage visibility
+    trace_files = []
+
+    # Plotly Graph Objects works best by adding traces manually for grouping.
+    # A single groupby pass partitions rows by (file, binary).
+    for (filename, binary), subset in df.groupby(["Data File", "Binary"], sort=False):
+        visible = (filename == data_files[0]) # Only make the first file visible by default
+
+        fig.add_trace(go.Bar(
+            x=subset["Benchmark"],
+            y=subset["Speed (M/s)"],
+            name=binary,
+            visible=visible,
+            customdata=subset[["Ratio"]],
+            hovertemplate=(
+                "<b>%{x}</b><br>" +
+                "Binary: " + binary + "<br>" +
+                "Speed: %{y:.2f} M/s<br>" +
+                "Ratio: %{customdata[0]:.2f}<extra></extra>"
+            )
+        ))
+        trace_files.append(filename)
 
     # --- 2. Create Dropdown Buttons ---
     buttons = []
-    current_idx = 0
 
-    for i, filename in enumerate(data_files):
+    for filename in data_files:
         # Create a visibility array [False, False, ..., True, True, ..., False]
-        # visible_status needs to match the total number of traces in the figure
-        visible_status = [False] * len(fig.data)
-
-        # Calculate the range of traces belonging to this file
-        num_traces = traces_per_file[i]
-        for j in range(num_traces):
-            visible_status[current_idx + j] = True
+        # with an entry for each trace in the figure
+        visible_status = [trace_file == filename for trace_file in trace_files]
 
         buttons.append(dict(
             label=filename,
@@ -113,8 +112,6 @@ def create_dashboard(df, output_file):
                   {"title": f"Benchmark Results: {filename}"}]
         ))
 
-        current_idx += num_traces
-
     # --- 3. Layout Configuration ---
     fig.update_layout(
         title=f"Benchmark Results: {data_files[0]}",
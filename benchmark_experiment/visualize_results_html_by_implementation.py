@@ -1,80 +1,200 @@
 import json
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.io._utils import plotly_cdn_url
+from plotly.offline import get_plotlyjs
 import argparse
+import base64
+import hashlib
 import os
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Results files larger than this are streamed (if ijson is available)
+# instead of being loaded as a whole.
+STREAMING_THRESHOLD_BYTES = 50 * 1024 * 1024
+
+# Placeholders in the HTML template of the report.
+TEMPLATE_PLACEHOLDER_RE = re.compile(r"%%(CONTROLS|PLOT_DIV|MAPPING_JSON)%%")
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Visualize per-implementation profiles.")
     parser.add_argument('-i', '--input', default='benchmark_results.json', help='Input JSON file')
     parser.add_argument('-o', '--output', default='implementation_profile.html', help='Output HTML file')
+    parser.add_argument('--max-points-per-trace', type=int, default=2000,
+                        help='Downsample (LTTB) traces with more points than this, 0 disables (default: 2000)')
     return parser.parse_args()
 
 def load_data(filepath):
+    if orjson is not None:
+        # orjson parses bytes directly, no text decoding step.
+        with open(filepath, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(filepath, 'r') as f:
+        return json.load(f)
+
+def stream_results_items(filepath):
+    """Yields (filename, binaries) pairs of the 'results' object one at a time."""
+    with open(filepath, 'rb') as f:
+        yield from ijson.kvitems(f, 'results', use_float=True)
+
+def load_results_items(filepath):
+    """
+    Returns an iterable of (filename, binaries) pairs of the 'results' object.
+    Large files are streamed, so only a single data file entry
+    is held in memory at a time.
+    """
     if not os.path.exists(filepath):
         print(f"File not found: {filepath}")
         exit(1)
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    if ijson is not None and os.path.getsize(filepath) > STREAMING_THRESHOLD_BYTES:
+        return stream_results_items(filepath)
+    return load_data(filepath).get("results", {}).items()
 
-def flatten_json_to_df(data):
+def flatten_json_to_df(results_items):
     """
     Flattens the nested results into a DataFrame using the custom 'Implementation' field.
     """
-    rows = []
-    results = data.get("results", {})
+    # Column-oriented buffers: one list per DataFrame column.
+    # Binary and benchmark names are only kept as part of the Implementation.
+    file_col, impl_col, speed_col, ratio_col = [], [], [], []
+    filenames = []
 
-    # Ensure consistent file ordering (Alphabetical)
-    sorted_filenames = sorted(results.keys())
+    # Implementation names are shared by many rows (one per file),
+    # so each distinct name is built once and reused.
+    impl_names = {}
 
-    for file_idx, filename in enumerate(sorted_filenames):
-        binaries = results[filename]
+    for filename, binaries in results_items:
+        filenames.append(filename)
         for binary_alias, bin_data in binaries.items():
             measurements = bin_data.get("measurements", {})
             for bench_name, metrics in measurements.items():
-
-                # --- YOUR SNIPPET LOGIC ---
-                rows.append({
-                    "FileIndex": file_idx + 1,
-                    "Data File": filename,
-                    "Binary": binary_alias,
-                    "Benchmark": bench_name,
-                    # Unique identifier: Benchmark Name + Binary Alias
-                    "Implementation": f"{binary_alias}+{bench_name}",
-                    "Speed": metrics.get("value_Mps", 0),
-                    "Ratio": metrics.get("ratio", 0)
-                })
-
-    return pd.DataFrame(rows)
+                file_col.append(filename)
+                # Unique identifier: Benchmark Name + Binary Alias
+                impl_name = impl_names.get((binary_alias, bench_name))
+                if impl_name is None:
+                    impl_name = f"{binary_alias}+{bench_name}"
+                    impl_names[(binary_alias, bench_name)] = impl_name
+                impl_col.append(impl_name)
+                speed_col.append(metrics.get("value_Mps", 0))
+                ratio_col.append(metrics.get("ratio", 0))
+
+    if not impl_col:
+        # Nothing measured: typed empty frame, no further processing.
+        return pd.DataFrame({
+            "FileIndex": pd.array([], dtype=np.int32),
+            "Data File": pd.Categorical([]),
+            "Implementation": pd.Categorical([], ordered=True),
+            "Speed": pd.array([], dtype=np.float32),
+            "Ratio": pd.array([], dtype=np.float64)
+        })
+
+    # Ensure consistent file ordering (Alphabetical),
+    # known only once all the files are seen.
+    file_index = {filename: i + 1 for i, filename in enumerate(sorted(filenames))}
+    file_idx_col = [file_index[filename] for filename in file_col]
+
+    return pd.DataFrame({
+        "FileIndex": pd.array(file_idx_col, dtype=np.int32),
+        "Data File": pd.Categorical(file_col, categories=sorted(filenames)),
+        # The distinct names are already known, no need to infer them.
+        "Implementation": pd.Categorical(
+            impl_col, categories=sorted(impl_names.values()), ordered=True),
+        "Speed": pd.array(speed_col, dtype=np.float32),
+        "Ratio": pd.array(ratio_col, dtype=np.float64)
+    })
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns sorted indices of the n_out points that keep the visual shape
+    of the (x, y) line, the first and the last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Inner points [1, n-1) split into n_out-2 buckets.
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Average point of the next bucket (the last point for the last bucket).
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Pick the point forming the largest triangle
+        # with the previously selected point and the next bucket average.
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+
+    return indices
 
 import html as _html
 import json as _json
 
-def create_dashboard(df, output_file):
-    if df.empty:
-        print("No data found.")
-        return
-
-    implementations = sorted(df["Implementation"].unique())
+def create_dashboard(df, output_file, max_points_per_trace=0):
+    # Categories are sorted at construction
+    implementations = df["Implementation"].cat.categories.tolist()
     fig = go.Figure()
 
-    impl_trace_indices = {impl: [] for impl in implementations}
+    # Each implementation has exactly one trace: {impl: trace index}
+    impl_trace_indices = {}
     trace_counter = 0
 
-    for i, impl in enumerate(implementations):
-        subset = df[df["Implementation"] == impl].sort_values("FileIndex")
-        if subset.empty:
-            continue
+    # One sort and one grouping pass instead of a mask scan per implementation.
+    # Groups come in sorted order, the same as `implementations`.
+    df_sorted = df.sort_values("FileIndex", kind="stable")
+    for impl, subset in df_sorted.groupby("Implementation", sort=True, observed=True):
+        # Plain numpy arrays: plotly converts to them anyway.
+        x = subset["FileIndex"].to_numpy()
+        y = subset["Speed"].to_numpy()
+        files = subset["Data File"].to_numpy()
+        ratios = subset["Ratio"].to_numpy()
+
+        if 0 < max_points_per_trace < len(x):
+            keep = lttb_indices(x, y, max_points_per_trace)
+            x, y, files, ratios = x[keep], y[keep], files[keep], ratios[keep]
+
+        customdata = np.column_stack([files, ratios, np.full(len(x), impl, dtype=object)])
 
         fig.add_trace(go.Scatter(
-            x=subset["FileIndex"],
-            y=subset["Speed"],
+            x=x,
+            y=y,
             mode='lines+markers',
             name=impl,
             visible=False,  # <-- start hidden; checkboxes will control visibility
             marker=dict(size=6),
             line=dict(width=2),
-            customdata=subset[["Data File", "Ratio", "Implementation"]],
+            customdata=customdata,
             hovertemplate=(
                 "<b>%{customdata[2]}</b><br>"
                 "File: %{customdata[0]}<br>"
@@ -83,7 +203,7 @@ def create_dashboard(df, output_file):
             )
         ))
 
-        impl_trace_indices[impl].append(trace_counter)
+        impl_trace_indices[impl] = trace_counter
         trace_counter += 1
 
     fig.update_layout(
@@ -104,27 +224,30 @@ def create_dashboard(df, output_file):
 
     # --- Build custom HTML with checkboxes ---
     # Default: check first two (or fewer if not available)
-    default_checked = set(implementations[:2])
-
-    controls_html = "\n".join(
-        f'''
-        <label class="impl-item">
-          <input type="checkbox" data-impl="{_html.escape(impl)}" {"checked" if impl in default_checked else ""}>
-          <span>{_html.escape(impl)}</span>
-        </label>
-        '''
-        for impl in implementations
-    )
-
-    # Produce only the plot div (no full HTML), then wrap it ourselves
-    # plot_div = fig.to_html(full_html=False, include_plotlyjs="cdn", div_id="plot")
-    plot_div = fig.to_html(
-        full_html=False,
-        include_plotlyjs="cdn",
-        div_id="plot",
-        config={"responsive": True},
-        default_width="100%",
-        default_height="100%"
+    checked_flags = ["checked"] * 2 + [""] * (len(implementations) - 2)
+
+    # Each name is escaped once and used for both the attribute and the label.
+    controls_html = "".join([
+        '<label class="impl-item"><input type="checkbox" data-impl="%s" %s><span>%s</span></label>\n'
+        % (safe, checked, safe)
+        for safe, checked in zip(map(_html.escape, implementations), checked_flags)
+    ])
+
+    # Produce only the plot div (no full HTML), then wrap it ourselves:
+    # the figure is embedded as plain JSON passed to Plotly.newPlot.
+    # The figure is already validated, so skip validation on export.
+    fig_json = pio.to_json(fig, validate=False)
+    # Same script tag as fig.to_html(include_plotlyjs="cdn"): the CDN serves
+    # the bundled plotly.js, so its hash is the subresource integrity value.
+    plotly_js_sri = "sha256-" + base64.b64encode(
+        hashlib.sha256(get_plotlyjs().encode("utf-8")).digest()).decode("ascii")
+    plot_div = (
+        f'<script charset="utf-8" src="{plotly_cdn_url()}" integrity="{plotly_js_sri}" crossorigin="anonymous"></script>\n'
+        '<div id="plot" class="plotly-graph-div"></div>\n'
+        '<script>\n'
+        f'  var figSpec = {fig_json};\n'
+        '  Plotly.newPlot("plot", figSpec.data, figSpec.layout, {responsive: true});\n'
+        '</script>'
     )
     mapping_json = json.dumps(impl_trace_indices)
 
@@ -242,52 +365,85 @@ def create_dashboard(df, output_file):
             // This forces the figure to exactly fill the left column
             Plotly.relayout(gd, { width: w, height: h });
         }
+        // Runs fn on the next animation frame, requests made
+        // before that frame are coalesced into a single call.
+        const scheduled = new Set();
+        function schedule(fn) {
+            if (scheduled.has(fn)) return;
+            scheduled.add(fn);
+            requestAnimationFrame(() => {
+                scheduled.delete(fn);
+                fn();
+            });
+        }
+
         // after layout is applied
-        requestAnimationFrame(forceResize);
+        schedule(forceResize);
         setTimeout(forceResize, 50);
 
-        // when user resizes window
-        window.addEventListener("resize", forceResize);
+        // when user resizes window: redraw once the resizing stops
+        let resizeTimer = null;
+        window.addEventListener("resize", () => {
+            clearTimeout(resizeTimer);
+            resizeTimer = setTimeout(forceResize, 150);
+        });
+
 
+        // Checkboxes are static, look them up once.
+        const boxes = [...document.querySelectorAll('#controls input[type="checkbox"]')];
 
         function getCheckedImpls() {
-          return [...document.querySelectorAll('#controls input[type="checkbox"]:checked')]
-            .map(cb => cb.dataset.impl);
+          return boxes.filter(cb => cb.checked).map(cb => cb.dataset.impl);
         }
 
+        // Visibility currently applied to each trace (all start hidden)
+        const prevVisible = gd.data.map(t => t.visible === true);
+
         function updatePlot() {
           const checked = getCheckedImpls();
-          const vis = new Array(gd.data.length).fill(false);
-
+          const wanted = new Set();
           checked.forEach(impl => {
-            (implToTraces[impl] || []).forEach(idx => vis[idx] = true);
+            const idx = implToTraces[impl];
+            if (idx !== undefined) wanted.add(idx);
           });
 
-          Plotly.restyle(gd, { visible: vis });
+          // Only touch the traces whose visibility flipped
+          const flipped = [];
+          const newVis = [];
+          for (let i = 0; i < prevVisible.length; i++) {
+            const want = wanted.has(i);
+            if (want !== prevVisible[i]) {
+              flipped.push(i);
+              newVis.push(want);
+              prevVisible[i] = want;
+            }
+          }
+          if (!flipped.length) return;
 
           const title = checked.length
             ? ("Implementations: " + checked.join("  vs  "))
             : "Select implementations to compare";
-          Plotly.relayout(gd, { "title.text": title });
-          setTimeout(resizePlotToContainer, 0);
+
+          // Changed traces and title in a single redraw
+          Plotly.update(gd, { visible: newVis }, { "title.text": title }, flipped);
         }
 
-        document.querySelectorAll('#controls input[type="checkbox"]').forEach(cb => {
-          cb.addEventListener('change', updatePlot);
+        // A single delegated listener handles all the checkboxes.
+        document.getElementById("controls").addEventListener("change", e => {
+          if (e.target.matches('input[type="checkbox"]')) schedule(updatePlot);
         });
 
         document.getElementById("btn-none").addEventListener("click", () => {
-          document.querySelectorAll('#controls input[type="checkbox"]').forEach(cb => cb.checked = false);
-          updatePlot();
+          boxes.forEach(cb => cb.checked = false);
+          schedule(updatePlot);
         });
         document.getElementById("btn-all").addEventListener("click", () => {
-          document.querySelectorAll('#controls input[type="checkbox"]').forEach(cb => cb.checked = true);
-          updatePlot();
+          boxes.forEach(cb => cb.checked = true);
+          schedule(updatePlot);
         });
         document.getElementById("btn-top2").addEventListener("click", () => {
-          const boxes = [...document.querySelectorAll('#controls input[type="checkbox"]')];
           boxes.forEach((cb, i) => cb.checked = (i < 2));
-          updatePlot();
+          schedule(updatePlot);
         });
 
         updatePlot();
@@ -296,24 +452,31 @@ def create_dashboard(df, output_file):
     </html>
     """
 
-    full_html = (html_template
-        .replace("%%CONTROLS%%", controls_html)
-        .replace("%%PLOT_DIV%%", plot_div)
-        .replace("%%MAPPING_JSON%%", mapping_json)
-    )
-
+    placeholders = {
+        "CONTROLS": controls_html,
+        "PLOT_DIV": plot_div,
+        "MAPPING_JSON": mapping_json,
+    }
 
+    # The page is written piece by piece (template text and inserted content),
+    # the whole document is never assembled in memory.
     print(f"Saving to {output_file}...")
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(full_html)
+    with open(output_file, "w", encoding="utf-8", buffering=1 << 20) as f:
+        for i, part in enumerate(TEMPLATE_PLACEHOLDER_RE.split(html_template)):
+            # split() with a group: odd parts are placeholder names
+            f.write(placeholders[part] if i % 2 else part)
     print("Done.")
 
 
 def main():
     args = parse_args()
-    raw_data = load_data(args.input)
-    df = flatten_json_to_df(raw_data)
-    create_dashboard(df, args.output)
+    results_items = load_results_items(args.input)
+    df = flatten_json_to_df(results_items)
+    if df.empty:
+        # Skip the figure and HTML generation altogether
+        print("No data found.")
+        return
+    create_dashboard(df, args.output, args.max_points_per_trace)
 
 if __name__ == "__main__":
     main()
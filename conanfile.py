@@ -6,6 +6,11 @@ from conan.tools.files import rmdir
 from conan.tools.scm import Version
 import os, sys, re
 
+VERSION_RE = re.compile(
+    r'VERSION_MAJOR\s+(\d+)ull.*?VERSION_MINOR\s+(\d+)ull.*?VERSION_PATCH\s+(\d+)ull',
+    re.DOTALL,
+)
+
 
 class JacobiConan(ConanFile):
 
@@ -15,15 +20,12 @@ class JacobiConan(ConanFile):
             "jacobi/include/jacobi/version.hpp"
         )
         with open(version_file_path, 'r') as file:
-            content = file.read()
-            major_match = re.search(r'VERSION_MAJOR\s+(\d+)ull', content)
-            minor_match = re.search(r'VERSION_MINOR\s+(\d+)ull', content)
-            patch_match = re.search(r'VERSION_PATCH\s+(\d+)ull', content)
-
-            if major_match and minor_match and patch_match:
-                major = int(major_match.group(1))
-                minor = int(minor_match.group(1))
-                patch = int(patch_match.group(1))
+            # The version defines are at the top of the header
+            content = file.read(8192)
+            version_match = VERSION_RE.search(content)
+
+            if version_match:
+                major, minor, patch = map(int, version_match.groups())
                 self.version = f"{major}.{minor}.{patch}"
             else:
                 raise ValueError(f"cannot detect version from {version_file_path}")